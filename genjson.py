@@ -1,7 +1,66 @@
 import json
-import random
-import copy
-from datetime import date, timedelta, time
+from datetime import date, timedelta
+
+import numpy as np
+import orjson
+from numba import njit, prange
+
+def _grains_to_dicts(diameters, areas):
+    """Converts parallel diameter/area lists into the JSON grain schema."""
+    return [{"diameter": d, "area": a} for d, a in zip(diameters, areas)]
+
+def _offsets(counts):
+    """Returns the cumulative start offsets (length n + 1) for a list of per-location counts."""
+    offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    return offsets
+
+def _uniform_f32(rng, low, high, size):
+    """Draws float32 uniforms in [low, high) into a preallocated buffer."""
+    out = np.empty(size, dtype=np.float32)
+    rng.random(out=out, dtype=np.float32)
+    out *= high - low
+    out += low
+    return out
+
+@njit("Tuple((f4[::1], f4[::1], i8[::1]))(f4[::1], f4[::1], i8[::1], f4[::1], f4[::1], f8, f4[::1], f4[::1], i8[::1])", parallel=True, cache=True)
+def evolve_grains(diam, area, offsets, keep_draws, change_factors, remove_chance, new_diam, new_area, new_offsets):
+    """
+    Evolves every location's grains by a single day.
+    Grains are stored flat, with location k at offsets[k]:offsets[k + 1]. Locations are
+    independent, so they are sharded across cores; all random draws are made up front
+    by the caller and this kernel only applies them.
+    """
+    num_locations = offsets.shape[0] - 1
+
+    # Pass 1: count survivors plus accreted grains for each location
+    counts = np.empty(num_locations, dtype=np.int64)
+    for loc in prange(num_locations):
+        survivors = 0
+        for k in range(offsets[loc], offsets[loc + 1]):
+            if keep_draws[k] > remove_chance:
+                survivors += 1
+        counts[loc] = survivors + new_offsets[loc + 1] - new_offsets[loc]
+
+    out_offsets = np.zeros(num_locations + 1, dtype=np.int64)
+    out_offsets[1:] = np.cumsum(counts)
+    out_d = np.empty(out_offsets[-1], dtype=np.float32)
+    out_a = np.empty(out_offsets[-1], dtype=np.float32)
+
+    # Pass 2: write each location's evolved grains into its own slice of the output
+    for loc in prange(num_locations):
+        j = out_offsets[loc]
+        for k in range(offsets[loc], offsets[loc + 1]):
+            if keep_draws[k] > remove_chance:
+                out_d[j] = abs(diam[k] * change_factors[k])
+                out_a[j] = abs(area[k] * change_factors[k])
+                j += 1
+        for k in range(new_offsets[loc], new_offsets[loc + 1]):
+            out_d[j] = new_diam[k]
+            out_a[j] = new_area[k]
+            j += 1
+
+    return out_d, out_a, out_offsets
 
 def generate_realistic_beach_data(num_runs, locations_per_run, grains_per_location, center_lat, center_lon, delta_max, beach_id="beachid_default", beach_name="Default Beach"):
     """
@@ -13,6 +72,9 @@ def generate_realistic_beach_data(num_runs, locations_per_run, grains_per_locati
     min_lat, max_lat = center_lat - delta_max, center_lat + delta_max
     min_lon, max_lon = center_lon - delta_max, center_lon + delta_max
 
+    # A single generator for all location, grain and daily draws, filled in bulk
+    rng = np.random.Generator(np.random.PCG64DXSM())
+
     # --- NEW: A single set of global tendencies for the entire beach ---
     # These parameters will be slightly randomized each day.
     global_tendency = {
@@ -30,101 +92,103 @@ def generate_realistic_beach_data(num_runs, locations_per_run, grains_per_locati
     print(f"\nGrid cell size: {cell_width:.6f}° x {cell_height:.6f}°")
     print(f"Total area: {(max_lon - min_lon):.6f}° x {(max_lat - min_lat):.6f}°")
     
-    all_grid_cells = [(x, y) for x in range(grid_size_x) for y in range(grid_size_y)]
+    num_cells = grid_size_x * grid_size_y
 
     # --- Step 1: Generate a single master list of locations (zone logic removed) ---
     print("\nGenerating master list of fixed locations...")
-    master_locations = []
-    num_locations = random.randint(locations_per_run[0], locations_per_run[1])
-    locations_per_cell = max(1, num_locations // len(all_grid_cells))
-    extra_locations = num_locations % len(all_grid_cells)
-    
-    random.shuffle(all_grid_cells)
+    num_locations = int(rng.integers(locations_per_run[0], locations_per_run[1] + 1))
+    locations_per_cell = max(1, num_locations // num_cells)
+    extra_locations = num_locations % num_cells
 
-    for cell_index, (cell_x, cell_y) in enumerate(all_grid_cells):
-        cell_min_lon = min_lon + cell_x * cell_width
-        cell_min_lat = min_lat + cell_y * cell_height
-        
-        current_cell_locations = locations_per_cell + (1 if cell_index < extra_locations else 0)
-        
-        for _ in range(current_cell_locations):
-            lon = round(random.uniform(cell_min_lon, cell_min_lon + cell_width), 7)
-            lat = round(random.uniform(cell_min_lat, cell_min_lat + cell_height), 7)
-            # Removed zone assignment. All locations are treated equally.
-            master_locations.append({"lat": lat, "lon": lon})
+    # Shuffle the cells so the extra locations land in random cells
+    cells = rng.permutation(num_cells)
+    cell_counts = np.full(num_cells, locations_per_cell)
+    cell_counts[:extra_locations] += 1
+    cell_for_location = np.repeat(cells, cell_counts)
+    num_locations = len(cell_for_location)
 
-    print(f"Master list created with {len(master_locations)} locations.")
+    # Place each location uniformly within its cell. All locations are treated equally.
+    cell_x = cell_for_location % grid_size_x
+    cell_y = cell_for_location // grid_size_x
+    master_lon = np.round(min_lon + (cell_x + rng.random(num_locations)) * cell_width, 7)
+    master_lat = np.round(min_lat + (cell_y + rng.random(num_locations)) * cell_height, 7)
+
+    print(f"Master list created with {num_locations} locations.")
     
     beach_data = {"_id": beach_id, "name": beach_name, "runs": []}
+    runs_grains = []
     start_date = date(2025, 9, 21)
 
     # --- NEW ALGORITHM: Step 2 ---
     # Loop through each run, evolving grain data with randomized global parameters.
     for i in range(num_runs):
         current_date = start_date + timedelta(days=i)
+        year, month, day = current_date.year, current_date.month, current_date.day
         run_data = {
-            "operation_id": f"run_{current_date.strftime('%Y%m%d')}",
-            "date": current_date.strftime('%Y-%m-%d'),
-            "time": time(random.randint(7, 18), random.randint(0, 59)).strftime('%H:%M'),
+            "operation_id": f"run_{year:04d}{month:02d}{day:02d}",
+            "date": f"{year:04d}-{month:02d}-{day:02d}",
+            "time": f"{int(rng.integers(7, 19)):02d}:{int(rng.integers(0, 60)):02d}",
             "locations": []
         }
         
         # --- NEW: Daily Global Fluctuations ---
         # Create a unique set of parameters for this specific run (day).
-        daily_params = copy.deepcopy(global_tendency)
-        daily_params['mean'] += random.uniform(-0.02, 0.02) # e.g., slightly accretive or erosive day
-        daily_params['add_chance'] += random.uniform(-0.03, 0.03)
-        daily_params['remove_chance'] += random.uniform(-0.03, 0.03)
+        daily_params = {**global_tendency}
+        daily_params['mean'] += rng.uniform(-0.02, 0.02) # e.g., slightly accretive or erosive day
+        daily_params['add_chance'] += rng.uniform(-0.03, 0.03)
+        daily_params['remove_chance'] += rng.uniform(-0.03, 0.03)
         
-        print(f"Run {i+1}: Processing {len(master_locations)} locations with chained algorithm...")
+        print(f"Run {i+1}: Processing {num_locations} locations with chained algorithm...")
 
-        for location_index, loc_info in enumerate(master_locations):
-            location_data = {"lat": loc_info["lat"], "lon": loc_info["lon"], "grains": []}
-            
-            if i == 0:
-                # FIRST RUN: Create the initial set of grains from scratch.
-                num_grains = random.randint(grains_per_location[0], grains_per_location[1])
-                for _ in range(num_grains):
-                    base_diameter = random.uniform(0.5, 1.5)
-                    base_area = random.uniform(0.2, 2.0)
-                    location_data["grains"].append({
-                        "diameter": abs(round(base_diameter, 5)),
-                        "area": abs(round(base_area, 5)),
-                    })
-            else:
-                # SUBSEQUENT RUNS: Evolve grains from the previous day using the daily global params.
-                previous_grains = beach_data["runs"][i-1]["locations"][location_index]["grains"]
-                
-                surviving_grains = []
-                # 1. Resize and potentially remove existing grains
-                for prev_grain in previous_grains:
-                    # Use the single, daily remove_chance for all locations
-                    if random.random() > max(0, daily_params["remove_chance"]): 
-                        change_factor = random.uniform(daily_params["mean"] - daily_params["dev"], daily_params["mean"] + daily_params["dev"])
-                        new_diameter = prev_grain["diameter"] * change_factor
-                        new_area = prev_grain["area"] * change_factor
-                        surviving_grains.append({
-                            "diameter": abs(round(new_diameter, 5)),
-                            "area": abs(round(new_area, 5)),
-                        })
-                
-                # 2. Potentially add new grains (accretion)
-                if random.random() < max(0, daily_params["add_chance"]):
-                    num_new_grains = random.randint(1, 7) 
-                    for _ in range(num_new_grains):
-                        base_diameter = random.uniform(0.5, 1.5)
-                        base_area = random.uniform(0.2, 2.0)
-                        surviving_grains.append({
-                            "diameter": abs(round(base_diameter, 5)),
-                            "area": abs(round(base_area, 5)),
-                        })
-
-                location_data["grains"] = surviving_grains
-
-            run_data["locations"].append(location_data)
-        
+        # Grain state is kept as flat float32 (diameter, area) arrays across all locations,
+        # with location k's grains at offsets[k]:offsets[k + 1].
+        # Each run's arrays are kept in runs_grains; dicts are only built at the end.
+        if i == 0:
+            # FIRST RUN: Create the initial set of grains from scratch.
+            counts = rng.integers(grains_per_location[0], grains_per_location[1] + 1, size=num_locations)
+            offsets = _offsets(counts)
+            diam = _uniform_f32(rng, 0.5, 1.5, offsets[-1])
+            area = _uniform_f32(rng, 0.2, 2.0, offsets[-1])
+        else:
+            # SUBSEQUENT RUNS: Draw every keep/resize decision for the day in one go,
+            # then evolve all locations from the previous day's state in parallel.
+            keep_draws = rng.random(offsets[-1], dtype=np.float32)
+            change_factors = _uniform_f32(rng, daily_params["mean"] - daily_params["dev"], daily_params["mean"] + daily_params["dev"], offsets[-1])
+
+            # Accretion: which locations gain grains today, and how many (1-7)
+            adds = rng.random(num_locations) < max(0, daily_params["add_chance"])
+            new_counts = np.zeros(num_locations, dtype=np.int64)
+            new_counts[adds] = rng.integers(1, 8, size=int(adds.sum()))
+            new_offsets = _offsets(new_counts)
+            new_diam = _uniform_f32(rng, 0.5, 1.5, new_offsets[-1])
+            new_area = _uniform_f32(rng, 0.2, 2.0, new_offsets[-1])
+
+            diam, area, offsets = evolve_grains(
+                diam, area, offsets,
+                keep_draws, change_factors,
+                max(0, daily_params["remove_chance"]),
+                new_diam, new_area, new_offsets,
+            )
+
+        runs_grains.append((diam, area, offsets))
         beach_data["runs"].append(run_data)
 
+    # --- Step 3: Split each run's flat grain arrays back into per-location lists ---
+    locations = list(zip(master_lat.tolist(), master_lon.tolist()))
+    for run_data, (diam, area, offsets) in zip(beach_data["runs"], runs_grains):
+        # Round once per run rather than per grain. Widen to float64 first so the
+        # rounded values serialize without float32 noise.
+        diam = np.round(diam.astype(np.float64), 5).tolist()
+        area = np.round(area.astype(np.float64), 5).tolist()
+        offsets = offsets.tolist()
+        for location_index, (lat, lon) in enumerate(locations):
+            start, end = offsets[location_index], offsets[location_index + 1]
+            run_data["locations"].append({
+                "lat": lat,
+                "lon": lon,
+                "grains": _grains_to_dicts(diam[start:end], area[start:end]),
+            })
+
     return beach_data
 
 if __name__ == "__main__":
@@ -191,8 +255,8 @@ if __name__ == "__main__":
     output_filename = f"{generation_params['beach_id']}_data.json"
 
     # Save the data to a file
-    with open(output_filename, 'w') as f:
-        json.dump(generated_data, f, indent=2)
+    with open(output_filename, 'wb') as f:
+        f.write(orjson.dumps(generated_data, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY))
 
     print(f"\nSuccessfully generated fine-grid data and saved it to '{output_filename}'")
     
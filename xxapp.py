@@ -1,8 +1,10 @@
-from flask import Flask, jsonify
+from flask import Flask, Response, jsonify, stream_with_context
+from flask.json.provider import JSONProvider
 from flask_cors import CORS
 from pymongo import MongoClient
+from pymongo.errors import InvalidName
 from bson import ObjectId
-import json
+import orjson
 import logging
 
 # Configure logging
@@ -12,17 +14,31 @@ logger = logging.getLogger(__name__)
 app = Flask(__name__)
 CORS(app)
 
-class JSONEncoder(json.JSONEncoder):
-    def default(self, o):
-        if isinstance(o, ObjectId):
-            return str(o)
-        return json.JSONEncoder.default(self, o)
+def orjson_default(o):
+    if isinstance(o, ObjectId):
+        return str(o)
+    raise TypeError(f"Type is not JSON serializable: {type(o).__name__}")
 
-app.json_encoder = JSONEncoder
+class OrjsonProvider(JSONProvider):
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=orjson_default).decode()
 
-client = MongoClient('mongodb://localhost:27017/')
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+app.json = OrjsonProvider(app)
+
+client = MongoClient('mongodb://localhost:27017/', maxPoolSize=50, minPoolSize=10,
+                     connectTimeoutMS=2000, serverSelectionTimeoutMS=2000,
+                     compressors='zstd,zlib')
 db = client['sih']
 
+# Warm the connection pool so the first request doesn't pay for the handshake
+try:
+    client.admin.command('ping')
+except Exception as e:
+    logger.error(f"MongoDB ping failed at startup: {str(e)}")
+
 @app.route("/api/beaches")
 def get_beaches():
     try:
@@ -44,9 +60,6 @@ def get_beaches():
 def get_runs(beach_id):
     try:
         logger.info(f"Fetching runs for beach ID: {beach_id}")
-        collection_names = db.list_collection_names()
-        logger.debug(f"Available collections: {collection_names}")
-        
         object_id = None
         try:
             object_id = ObjectId(beach_id)
@@ -55,63 +68,105 @@ def get_runs(beach_id):
             object_id = beach_id
             logger.debug(f"Using beach_id as string: {beach_id}")
             
+        # A beach's collection is named after its id, so look it up directly
+        # instead of scanning list_collection_names()
         beach_collection_name = None
-        for name in collection_names:
-            if name == beach_id or name == str(object_id):
+        beach_doc = None
+        for name in dict.fromkeys((beach_id, str(object_id))):
+            try:
+                collection = db[name]
+            except InvalidName:
+                # Not a valid collection name (e.g. contains '$'), so it can't be a beach
+                continue
+            # Fetch every header field (the dashboards read name, lat/lon, start_lat/start_lon);
+            # the runs are streamed one at a time below
+            beach_doc = collection.find_one({}, {"runs": 0})
+            if beach_doc:
                 beach_collection_name = name
                 break
                 
-        if not beach_collection_name:
+        if not beach_doc:
             logger.warning(f"Beach collection not found for ID: {beach_id}")
             return jsonify({"error": f"Beach '{beach_id}' not found."}), 404
             
         logger.info(f"Found beach collection: {beach_collection_name}")
-        beach_doc = db[beach_collection_name].find_one({})
+        beach_collection = db[beach_collection_name]
         
-        if beach_doc:
-            logger.info(f"Retrieved beach document with {len(beach_doc.get('runs', []))} runs")
-            
-            # Log detailed structure information
-            if "runs" in beach_doc:
-                logger.info(f"Total runs: {len(beach_doc['runs'])}")
-                for i, run in enumerate(beach_doc["runs"]):
-                    locations_count = len(run.get("locations", []))
-                    total_grains = sum(len(loc.get("grains", [])) for loc in run.get("locations", []))
-                    logger.info(f"Run {i+1}: {run.get('operation_id', 'N/A')} - {locations_count} locations, {total_grains} total grains")
-                    
-                    # Log sample grain data for first location of first run
-                    if i == 0 and run.get("locations"):
-                        first_loc = run["locations"][0]
-                        grains = first_loc.get("grains", [])
-                        if grains:
-                            logger.debug(f"Sample grain data - First location, first run:")
-                            logger.debug(f"  Grains count: {len(grains)}")
-                            logger.debug(f"  First grain: diameter={grains[0].get('diameter', 'N/A')}, area={grains[0].get('area', 'N/A')}")
-            
-            if "_id" in beach_doc and isinstance(beach_doc["_id"], ObjectId):
-                beach_doc["_id"] = str(beach_doc["_id"])
-            
-            if "name" not in beach_doc:
-                beach_info_id = object_id if isinstance(object_id, ObjectId) else ObjectId(beach_id) if len(beach_id) == 24 else beach_id
-                beach_info = db['1beaches'].find_one({"_id": beach_info_id})
-                beach_doc["name"] = beach_info["name"] if beach_info and "name" in beach_info else "Unknown Beach"
-                logger.info(f"Retrieved beach name from 1beaches: {beach_doc['name']}")
-            
-            if "runs" not in beach_doc:
-                beach_doc["runs"] = []
-                logger.warning("No runs found in beach document")
+        doc_id = beach_doc["_id"]
+        
+        if "_id" in beach_doc and isinstance(beach_doc["_id"], ObjectId):
+            beach_doc["_id"] = str(beach_doc["_id"])
+        
+        if "name" not in beach_doc:
+            beach_info_id = object_id if isinstance(object_id, ObjectId) else ObjectId(beach_id) if len(beach_id) == 24 else beach_id
+            beach_info = db['1beaches'].find_one({"_id": beach_info_id})
+            beach_doc["name"] = beach_info["name"] if beach_info and "name" in beach_info else "Unknown Beach"
+            logger.info(f"Retrieved beach name from 1beaches: {beach_doc['name']}")
+        
+        def encode_run(run, index):
+            # Log detailed structure information (walks every grain, so debug only)
+            if logger.isEnabledFor(logging.DEBUG):
+                locations_count = len(run.get("locations", []))
+                total_grains = sum(len(loc.get("grains", [])) for loc in run.get("locations", []))
+                logger.debug(f"Run {index+1}: {run.get('operation_id', 'N/A')} - {locations_count} locations, {total_grains} total grains")
+                
+                # Log sample grain data for first location of first run
+                if index == 0 and run.get("locations"):
+                    first_loc = run["locations"][0]
+                    grains = first_loc.get("grains", [])
+                    if grains:
+                        logger.debug(f"Sample grain data - First location, first run:")
+                        logger.debug(f"  Grains count: {len(grains)}")
+                        logger.debug(f"  First grain: diameter={grains[0].get('diameter', 'N/A')}, area={grains[0].get('area', 'N/A')}")
             
-            for run in beach_doc["runs"]:
-                run.setdefault("operation_id", f"run_{run.get('date', 'unknown')}")
-                run.setdefault("locations", [])
-                for location in run["locations"]:
-                    location.setdefault("grains", [])
+            # Runs written by genjson.py always have an operation_id. Missing locations or
+            # grains are left as-is; the dashboards already treat them as empty.
+            if "operation_id" not in run:
+                run["operation_id"] = f"run_{run.get('date', 'unknown')}"
             
-            logger.info(f"Successfully processed beach data for: {beach_doc.get('name', 'Unknown')}")
-            return jsonify(beach_doc)
-        else:
-            logger.error(f"Beach data not found in collection: {beach_collection_name}")
-            return jsonify({"error": "Beach data not found"}), 404
+            return orjson.dumps(run, default=orjson_default)
+        
+        runs = beach_collection.aggregate([
+            {"$match": {"_id": doc_id}},
+            # Only decode the fields the dashboard reads
+            {"$project": {
+                "runs.operation_id": 1, "runs.date": 1, "runs.time": 1,
+                "runs.locations.lat": 1, "runs.locations.lon": 1, "runs.locations.grains": 1,
+            }},
+            {"$unwind": "$runs"},
+            {"$replaceRoot": {"newRoot": "$runs"}},
+        ])
+        
+        # Read and encode the first run before responding, so cursor or encoding
+        # errors at startup still return the usual 500
+        first_run = next(runs, None)
+        first_chunk = encode_run(first_run, 0) if first_run is not None else None
+        
+        def generate():
+            # Send the document header first, then each run as it comes off the cursor
+            yield orjson.dumps(beach_doc, default=orjson_default)[:-1] + b',"runs":['
+            runs_count = 0
+            try:
+                if first_chunk is not None:
+                    yield first_chunk
+                    runs_count += 1
+                    for run in runs:
+                        yield b',' + encode_run(run, runs_count)
+                        runs_count += 1
+            except Exception as e:
+                # The 200 has already been sent, so re-raise to abort the chunked response
+                # before the closing ]} and let the client see a failed fetch
+                logger.error(f"Error fetching runs for beach {beach_id}: {str(e)}")
+                raise
+            else:
+                if not runs_count:
+                    logger.warning("No runs found in beach document")
+                logger.info(f"Successfully streamed {runs_count} runs for: {beach_doc.get('name', 'Unknown')}")
+            finally:
+                runs.close()
+            yield b']}'
+        
+        return Response(stream_with_context(generate()), mimetype='application/json')
     except Exception as e:
         logger.error(f"Error fetching runs for beach {beach_id}: {str(e)}")
         return jsonify({"error": str(e)}), 500
@@ -122,5 +177,6 @@ def health_check():
     return jsonify({"status": "ok", "message": "Server is running"})
 
 if __name__ == '__main__':
+    # Local development only; in production run under gunicorn (see Procfile)
     logger.info("Starting Flask server on port 5000")
-    app.run(debug=True, port=5000, threaded=True)
\ No newline at end of file
+    app.run(port=5000, threaded=True)
\ No newline at end of file